@@ -15,7 +15,18 @@ class Node:
             raise ValueError("Position input must contain exactly 3 numbers.")
         
         self.name = name
-        self.position = np.array(position, dtype=float)
+
+        # The position is a row of a (n_nodes, 3) array. Once the node is part of a Tensegrity this is the Tensegrity's shared Positions array
+        self._positions = np.array([position], dtype=float)
+        self._idx = 0
+
+    @property
+    def position(self) -> np.ndarray:
+        return self._positions[self._idx]
+
+    @position.setter
+    def position(self, position):
+        self._positions[self._idx, :len(position)] = position # allows setting only the first d coordinates
 
     def __str__(self):
         return f"Node: {self.name}  Position: {self.position}"
@@ -73,10 +84,19 @@ class Control:
 class Tensegrity:
     def __init__(self, Nodes: List[Node], Connections: List[Connection], Pins: Dict[str, List[bool]] = [], Controls: List[Control] = []):
         self.Nodes = Nodes
+
+        # Node positions stored in one contiguous (n_nodes, 3) array, each Node's position is a view of its row
+        self.Positions = np.array([node.position for node in Nodes], dtype=float).reshape(-1, 3)
+        for i, node in enumerate(Nodes):
+            node._positions = self.Positions
+            node._idx = i
+
         self.Connections = Connections
+        self._connection_by_name = {connection.name: connection for connection in Connections if connection.name is not None} # name lookup for change_connection_length
         self.Pins = Pins
         self.Controls = Controls
         self.ControlsDict = {control.connection.name: control for control in Controls} # TODO: use either this or the list, not both
+        self._lengths_version = 0 # incremented when a connection length changes, so the Optimizer knows to update its copies
     
     # TODO: Change method to use control strings instead of a named connections
     def change_connection_length(self, connection_name: str, delta: float):
@@ -87,9 +107,73 @@ class Tensegrity:
             connection_name (str): The name of the connection to change.
             delta (float): The amount to change the length by.
         """
-        for connection in self.Connections:
-            if connection.name == connection_name:
-                connection.length += delta
-                return
-        raise ValueError("Connection name not found.")
-    
\ No newline at end of file
+        connection = self._connection_by_name.get(connection_name)
+        if connection is None:
+            raise ValueError("Connection name not found.")
+        connection.length += delta
+        self._lengths_version += 1
+
+
+class IndexArrays:
+    """
+    Collects the index arrays the Optimizer's compiled kernels use, one connection at a time, and caches each connection's node indices in connection._idx.
+    Connections with stiffness > 0 are strings, split into segments (consecutive node pairs) with the segments of a string contiguous.
+    Connections with stiffness == 0 are bars.
+
+    Attributes:
+        node_indices (Dict[str, int]): The index of each node (by name) in the tensegrity's node list.
+    """
+
+    def __init__(self, node_indices: Dict[str, int]):
+        self.node_indices = node_indices
+        self.string_seg_i, self.string_seg_j, self.string_seg_conn, self.string_k, self.bar_i, self.bar_j = [], [], [], [], [], []
+
+    def add_connection(self, connection: Connection):
+        """
+        Adds a connection to the arrays. Must be called in the order the connections are stored in the tensegrity.
+
+        Args:
+            connection (Connection): The connection to add.
+        """
+        connection._idx = np.array([self.node_indices[node.name] for node in connection.nodes], dtype=np.intp)
+        if connection.stiffness > 0: # string
+            self.string_seg_conn.extend([len(self.string_k)] * (len(connection._idx) - 1))
+            self.string_seg_i.extend(connection._idx[:-1])
+            self.string_seg_j.extend(connection._idx[1:])
+            self.string_k.append(connection.stiffness)
+        elif connection.stiffness == 0: # bar
+            self.bar_i.append(connection._idx[0])
+            self.bar_j.append(connection._idx[1])
+
+    def to_dict(self) -> Dict[str, np.ndarray]:
+        """
+        Returns:
+            Dict[str, np.ndarray]: 'string_seg_i', 'string_seg_j' (node indices of each segment), 'string_seg_conn' (string index of each segment),
+                                   'string_k' (stiffness of each string), 'bar_i', 'bar_j' (node indices of each bar).
+        """
+        return {
+            'string_seg_i': np.array(self.string_seg_i, dtype=np.intp),
+            'string_seg_j': np.array(self.string_seg_j, dtype=np.intp),
+            'string_seg_conn': np.array(self.string_seg_conn, dtype=np.intp),
+            'string_k': np.array(self.string_k, dtype=float),
+            'bar_i': np.array(self.bar_i, dtype=np.intp),
+            'bar_j': np.array(self.bar_j, dtype=np.intp),
+        }
+
+
+def build_index_arrays(Nodes: List[Node], Connections: List[Connection]) -> Dict[str, np.ndarray]:
+    """
+    Builds the index arrays for all connections of a tensegrity at once, see IndexArrays.
+
+    Args:
+        Nodes (List[Node]): The nodes of the tensegrity, in order.
+        Connections (List[Connection]): The connections of the tensegrity.
+
+    Returns:
+        Dict[str, np.ndarray]: See IndexArrays.to_dict.
+    """
+    index_arrays = IndexArrays({node.name: i for i, node in enumerate(Nodes)})
+    for connection in Connections:
+        index_arrays.add_connection(connection)
+
+    return index_arrays.to_dict()
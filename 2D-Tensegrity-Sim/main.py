@@ -1,10 +1,11 @@
 import argparse
+import numpy as np
 
 from yaml_parser import YamlParser
 from visualization import Visualization as Viz
 from optimization import Optimizer
 
-def main(file):
+def main(file, sweep=None):
     # Load the tensegrity system from the YAML file
     tensegrity_system = YamlParser.parse(file)
     
@@ -20,6 +21,12 @@ def main(file):
     opt.optimize()
     viz.plot(label_nodes=True, label_connections=True)
 
+    if sweep is not None:
+        # Solve for each change in length in parallel and print the resulting connection forces
+        for delta, positions, forces in opt.optimize_batch(sweep, "String1"):
+            print(f"{delta:.3f}: {forces}")
+        return
+
     d_length = get_float_input("Change connection length by (0 to exit): ")
     while d_length:
         tensegrity_system.change_connection_length("String1", d_length)
@@ -40,10 +47,34 @@ def get_float_input(prompt):
         except ValueError:
             print("Invalid input. Please enter a valid floating-point number.")
 
+def parse_sweep(value):
+    """
+    Parses the --sweep argument "start,stop,step" into the length changes to solve for: start, start + step, ... up to stop.
+    stop is included when the range is a multiple of step.
+
+    Raises:
+        argparse.ArgumentTypeError: If the argument isn't 3 numbers or the step doesn't lead from start to stop.
+    """
+    try:
+        start, stop, step = [float(v) for v in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected start,stop,step (3 numbers), got '{value}'")
+    if step == 0 or (stop - start) / step < 0:
+        raise argparse.ArgumentTypeError(f"step {step} doesn't lead from {start} to {stop}")
+
+    # Each delta is computed from start (not accumulated like arange) so they don't collect rounding error, 0 instead of ~1e-17.
+    # The small margin keeps stop when the division lands just below a whole number.
+    n_steps = int(np.floor((stop - start) / step + 1e-9))
+    deltas = start + step * np.arange(n_steps + 1)
+    if np.isclose(deltas[-1], stop):
+        deltas[-1] = stop
+    return deltas
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='2D Tensegrity Simulator')
     parser.add_argument("filename", help="YAML file to load", default="yaml/1-box.yaml")
+    parser.add_argument("--sweep", help="Solve for a range of length changes instead of asking for them, given as start,stop,step (stop is included)", type=parse_sweep)
 
     args = vars(parser.parse_args())
-    main(file=args["filename"])
\ No newline at end of file
+    main(file=args["filename"], sweep=args["sweep"])
\ No newline at end of file
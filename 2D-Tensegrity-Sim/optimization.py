@@ -1,11 +1,128 @@
 import numpy as np
-from typing import List, Tuple, Dict
-from scipy.optimize import minimize
-
-from data_structures import Connection, Tensegrity
+import pickle
+from typing import List, Tuple
+from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
+from scipy.optimize import minimize, NonlinearConstraint, BFGS
+from scipy.sparse import csr_matrix
+from numba import njit
+
+from data_structures import Tensegrity, build_index_arrays
 np.set_printoptions(precision=3, suppress=True) # for debugging
 
 
+# --------------------- COMPILED KERNELS ---------------------
+# The solver calls these hundreds of times per solve, so they are compiled with numba to avoid python overhead.
+# They release the GIL so finite difference columns can be evaluated on several threads.
+# Strings are given as segments (consecutive node pairs): seg_i, seg_j are the node indices of each segment and
+# seg_conn is the index of the string each segment belongs to.
+
+@njit(cache=True, nogil=True)
+def _string_lengths_kernel(N, seg_i, seg_j, seg_conn, n_strings):
+    """
+    Returns the vector and length of each segment and the total current length of each string.
+    """
+    seg_vec = np.empty((len(seg_i), N.shape[1]))
+    seg_len = np.empty(len(seg_i))
+    l = np.zeros(n_strings)
+    for s in range(len(seg_i)):
+        dist = 0.0
+        for a in range(N.shape[1]):
+            seg_vec[s, a] = N[seg_j[s], a] - N[seg_i[s], a]
+            dist += seg_vec[s, a] * seg_vec[s, a]
+        seg_len[s] = np.sqrt(dist)
+        l[seg_conn[s]] += seg_len[s]
+    return seg_vec, seg_len, l
+
+@njit(cache=True, nogil=True)
+def _spring_energy_kernel(N, seg_i, seg_j, seg_conn, k, L0):
+    """
+    Returns the energy stored in each string.
+    """
+    _, _, l = _string_lengths_kernel(N, seg_i, seg_j, seg_conn, len(k))
+    return 0.5 * k * (l - L0)**2
+
+@njit(cache=True, nogil=True)
+def _spring_forces_kernel(N, seg_i, seg_j, seg_conn, k, L0, clamp, forces):
+    """
+    Adds the forces the strings exert on the nodes to the (n_nodes, d) array forces (in place) and returns the scalar force in each string.
+    If clamp is True string forces can only be positive (strings can't push), otherwise the negated forces are the energy gradient.
+    """
+    seg_vec, seg_len, l = _string_lengths_kernel(N, seg_i, seg_j, seg_conn, len(k))
+
+    F = k * (l - L0)
+    if clamp:
+        F = np.maximum(0.0, F)
+
+    for s in range(len(seg_i)):
+        f = F[seg_conn[s]] / seg_len[s] # scale the segment vector to the force in one multiply
+        for a in range(N.shape[1]):
+            v = f * seg_vec[s, a]
+            forces[seg_i[s], a] += v
+            forces[seg_j[s], a] -= v
+    return F
+
+@njit(cache=True, nogil=True)
+def _bar_constraint_kernel(N, bar_i, bar_j, L0):
+    """
+    Returns the difference between the current and rest length of each bar.
+    """
+    c = np.empty(len(bar_i))
+    for b in range(len(bar_i)):
+        dist = 0.0
+        for a in range(N.shape[1]):
+            v = N[bar_j[b], a] - N[bar_i[b], a]
+            dist += v * v
+        c[b] = np.sqrt(dist) - L0[b]
+    return c
+
+@njit(cache=True, nogil=True)
+def _bar_forces_kernel(N, bar_i, bar_j, B_forces, forces):
+    """
+    Adds the forces the bars exert on the nodes to forces (in place).
+    """
+    bar_vec = np.empty(N.shape[1])
+    for b in range(len(bar_i)):
+        dist = 0.0
+        for a in range(N.shape[1]):
+            bar_vec[a] = N[bar_j[b], a] - N[bar_i[b], a]
+            dist += bar_vec[a] * bar_vec[a]
+        f = B_forces[b] / np.sqrt(dist)
+        for a in range(N.shape[1]):
+            v = f * bar_vec[a]
+            forces[bar_i[b], a] += v
+            forces[bar_j[b], a] -= v
+
+
+# State of an optimize_batch worker process, set once per process by _init_batch_worker instead of being sent with every delta
+_batch_optimizer = None # the pickled Optimizer
+_batch_connection_name = None
+_batch_optimize_kwargs = None
+
+def _init_batch_worker(pickled_optimizer: bytes, connection_name: str, optimize_kwargs: dict) -> None:
+    """
+    Pool initializer for Optimizer.optimize_batch, stores what every solve in this worker process needs.
+    """
+    global _batch_optimizer, _batch_connection_name, _batch_optimize_kwargs
+    _batch_optimizer = pickled_optimizer
+    _batch_connection_name = connection_name
+    _batch_optimize_kwargs = optimize_kwargs
+
+def _solve_one(args: Tuple[int, float]) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Worker for Optimizer.optimize_batch. Each solve unpickles its own copy of the optimizer (and tensegrity), so every delta starts from the same state.
+    """
+    i, delta = args
+    opt = pickle.loads(_batch_optimizer)
+
+    opt.tensegrity.change_connection_length(_batch_connection_name, delta)
+    opt.optimize(**_batch_optimize_kwargs)
+
+    positions = opt.tensegrity.Positions[:, :opt.d].copy()
+    forces = np.array([connection.force for connection in opt.connections])
+    return i, positions, forces
+
+
 class Optimizer:
     def __init__(self, tensegrity: Tensegrity, d: int = 3) -> None:
             """
@@ -18,6 +135,7 @@ class Optimizer:
             Raises:
             - ValueError: If connection stiffness is less than 0.
             """
+            self.tensegrity = tensegrity
             self.nodes = tensegrity.Nodes
             self.connections = tensegrity.Connections
 
@@ -41,8 +159,61 @@ class Optimizer:
             self.node_indices = {node.name: i for i, node in enumerate(self.nodes)}
             self.bar_indices = {connection: i for i, connection in enumerate(self.bar_connections)}
 
+            # Index arrays so the string and bar equations can be evaluated by the compiled kernels.
+            # YamlParser builds these while parsing, they are rebuilt if the connections changed since.
+            prebuilt = getattr(tensegrity, '_prebuilt_arrays', None)
+            if prebuilt is None or len(prebuilt['string_k']) != len(self.string_connections) or len(prebuilt['bar_i']) != len(self.bar_connections):
+                prebuilt = build_index_arrays(self.nodes, self.connections)
+
+            self._string_seg_i = prebuilt['string_seg_i']
+            self._string_seg_j = prebuilt['string_seg_j']
+            self._string_seg_conn = prebuilt['string_seg_conn'] # string index of each segment
+            self._string_k = prebuilt['string_k']
+            self._bar_i = prebuilt['bar_i']
+            self._bar_j = prebuilt['bar_j']
+
+            control_strings, control_nodes, control_dirs = [], [], []
+            for s, connection in enumerate(self.string_connections):
+                if connection.name and connection.name in self.controls:
+                    control = self.controls[connection.name]
+                    control_strings.append(s)
+                    control_nodes.append(self.node_indices[control.node.name])
+                    control_dirs.append(control.direction[:self.d] / np.linalg.norm(control.direction[:self.d]))
+
+            self._control_strings = np.array(control_strings, dtype=np.intp)
+            self._control_nodes = np.array(control_nodes, dtype=np.intp)
+            self._control_dirs = np.array(control_dirs, dtype=float).reshape(-1, self.d) # unit direction each control string is pulled
+
+            # Pinned coordinates are removed from the input vector and held at their starting position
+            self._pinned_mask = np.zeros(len(self.nodes)*self.d, dtype=bool)
+            for node, bools in self.pinned_nodes.items():
+                for i in range(self.d):
+                    if bools[i]:
+                        self._pinned_mask[self.node_indices[node]*self.d + i] = True
+            self._free_slots = np.where(~self._pinned_mask)[0] # flat indices of the coordinates in the input vector
+            self._n_free = len(self._free_slots)
+
+            # Flat node positions with the pinned coordinates already filled in (at the start of each solve), so unpacking x only has to fill the free ones
+            self._N_template = np.zeros(len(self._pinned_mask))
+
+            # Sparsity structure of the bar constraint jacobian: each bar only has entries at the (unpinned) coordinates of its 2 nodes
+            x_cols = np.full(len(self._pinned_mask), -1)
+            x_cols[self._free_slots] = np.arange(len(self._free_slots))
+            bar_dofs = np.stack((self._bar_i, self._bar_j))[:, :, None]*self.d + np.arange(self.d) # (2, n_bars, d)
+            bar_rows = np.broadcast_to(np.arange(len(self.bar_connections))[None, :, None], bar_dofs.shape)
+            self._bar_jac_keep = ~self._pinned_mask[bar_dofs.ravel()]
+            self._bar_jac_rows = bar_rows.ravel()[self._bar_jac_keep]
+            self._bar_jac_cols = x_cols[bar_dofs.ravel()][self._bar_jac_keep]
+
+            self.sync_lengths()
+
+            self._last_x = None # solution of the last solve, used when a warm start is requested
+
+            # Constraints for each solver, built once and reused by every solve (unless a thread pool is used)
+            self._constraints = {method: self._buildConstraints(method) for method in ('SLSQP', 'trust-constr')}
+
     
-    def optimize(self) -> None:
+    def optimize(self, warm_start: bool = False, method: str = 'SLSQP', tol_force: float = 1e-3, workers: int = 1) -> None:
             """
             Optimizes the position of nodes in the tensegrity structure.
             
@@ -50,104 +221,224 @@ class Optimizer:
             in the tensegrity structure. It iteratively adjusts the positions of the nodes to minimize the objective function,
             which is the sum of squared node equations. The node equations represent the forces acting on each node due to the
             string and bar connections in the structure.
+
+            Parameters:
+            - warm_start (bool): If True, the bar forces from the last solve are used as the initial guess instead of the default.
+                                 Can save iterations for small changes, but can also end in a different equilibrium (default is False).
+            - method (str): The scipy solver to use, 'SLSQP' or 'trust-constr' (default is 'SLSQP').
+                            trust-constr uses a sparse bar constraint jacobian and scales better to large structures.
+            - tol_force (float): The solve stops early once every node force is below this and the bars are at their length (within the solver tolerance)
+                                 (default is 1e-3). None to disable. Only node forces are checked, not that the energy is at its minimum,
+                                 so a large tol_force can stop at a different equilibrium than the full solve.
+            - workers (int): Number of threads used to estimate the node force constraint jacobian by finite differences (default is 1).
+                             Only worth it for structures with many nodes.
             
             Returns:
                 None. Changes are made internally to the Tensegrity object.
             """
             
-            constraints = [{'type': 'eq', 'fun': self._barConstraints}, {'type': 'ineq', 'fun': lambda x: 1e-1 - self._nodeForces(x)}]
+            if self._lengths_version != self.tensegrity._lengths_version:
+                self.sync_lengths() # connection lengths were changed since the last solve
+
+            # Pinned nodes may have been moved since the last solve
+            self._N_template[self._pinned_mask] = self.tensegrity.Positions[:, :self.d].ravel()[self._pinned_mask]
+
+            x0 = self._createInputX(warm_start)
 
-            x0 = self._createInputX()
-            result = minimize(self._objective, x0, constraints=constraints, tol=1e-4, options={'maxiter': 1000})
+            tol = 1e-4 # solver tolerance, also the bar length tolerance of the early stop
+            self._tol_force = tol_force
+            self._tol_bar_length = tol
+            self._halted_x = None
+            callback = self._haltIfConverged if tol_force is not None else None
+
+            if method not in self._constraints:
+                raise ValueError(f"Unknown optimization method {method}.")
+
+            executor = ThreadPoolExecutor(workers) if workers > 1 else None
+            try:
+                constraints = self._constraints[method] if executor is None else self._buildConstraints(method, executor)
+
+                if method == 'SLSQP':
+                    result = minimize(self._objective, x0, jac=self._objectiveJac, constraints=constraints, tol=tol, callback=callback, options={'maxiter': 1000})
+                else:
+                    result = minimize(self._objective, x0, method='trust-constr', jac=self._objectiveJac, hess=BFGS(), constraints=constraints, tol=tol, callback=callback, options={'maxiter': 1000, 'sparse_jacobian': True})
+            except StopIteration:
+                result = None # the callback halted the solve and scipy didn't catch it
+            finally:
+                if executor:
+                    executor.shutdown()
             
-            if not result.success:
+            if self._halted_x is not None:
+                x = self._halted_x # stopped early by the callback, minimize reports this as a failure
+            elif result.success:
+                x = result.x
+            else:
                 print(result)
                 print(self._nodeForces(result.x))
                 raise ValueError("Optimization failed.")
 
-            N, B_forces = self._getFromInputX(result.x)
+            self._last_x = x.copy()
 
-            self._nodeForces(result.x) # BUG for debugging
+            N, B_forces = self._getFromInputX(x)
+
+            self._nodeForces(x) # BUG for debugging
 
             # update the forces in the connections
             self._updateForces(N, B_forces)
 
-            for i, node in enumerate(self.nodes):
-                node.position = N[i]
+            self.tensegrity.Positions[:, :self.d] = N # updates the positions of all nodes
 
 
             return
+
+    def optimize_batch(self, delta_list: List[float], connection_name: str, **optimize_kwargs) -> List[Tuple[float, np.ndarray, np.ndarray]]:
+            """
+            Solves the tensegrity structure for several changes in a connection's length, in parallel.
+
+            Each solve starts from the current state of the tensegrity and is independent of the others, the tensegrity itself is not changed.
+
+            Parameters:
+            - delta_list (List[float]): The amounts to change the length of the connection by.
+            - connection_name (str): The name of the connection to change.
+            - **optimize_kwargs: Passed to optimize for every solve (method, tol_force, workers, ...).
+
+            Returns:
+            - List[Tuple[float, np.ndarray, np.ndarray]]: For each delta (in the order given): the delta, the (n_nodes, d) node positions and the force in each connection.
+            """
+            results = [None] * len(delta_list)
+            # The optimizer is sent to each worker process once, the tasks only carry the delta
+            with Pool(initializer=_init_batch_worker, initargs=(pickle.dumps(self), connection_name, optimize_kwargs)) as pool:
+                for i, positions, forces in pool.imap_unordered(_solve_one, list(enumerate(delta_list))):
+                    results[i] = (delta_list[i], positions, forces)
+
+            return results
+
+    def reset_warm_start(self) -> None:
+            """
+            Forgets the last solution so the next warm started solve uses the default initial guess for the bar forces.
+            Should be called if the structure is changed in a way other than changing connection lengths.
+            """
+            self._last_x = None
+
+    def sync_lengths(self) -> None:
+            """
+            Copies the rest lengths of the connections into the arrays used by the solver.
+            Tensegrity.change_connection_length is picked up automatically, this only needs to be called if a connection's length is set directly.
+            """
+            self._string_L0 = np.array([connection.length for connection in self.string_connections], dtype=float)
+            self._bar_L0 = np.array([connection.length for connection in self.bar_connections], dtype=float)
+            self._lengths_version = self.tensegrity._lengths_version
     
 
     # --------------------- INTERNAL FUNCTIONS ---------------------
+    def _haltIfConverged(self, xk: np.ndarray, *args) -> None:
+        """
+        Callback for minimize, stops the solve once the structure is in equilibrium (within tol_force) with the bars at their length (within the solver tolerance).
+        Forces and lengths are different units, so they have separate tolerances.
+        Uses the classic callback(xk) signature (trust-constr also passes its state), which every scipy version supports for both solvers.
+
+        Raises:
+            StopIteration: If every node force is below tol_force and every bar length error is below the solver tolerance.
+        """
+        if self._nodeForces(xk).max(initial=0) < self._tol_force and np.abs(self._barConstraints(xk)).max(initial=0) < self._tol_bar_length:
+            self._halted_x = np.copy(xk) # older scipy doesn't return a result when SLSQP is stopped
+            raise StopIteration
+
+    def _buildConstraints(self, method: str, executor: ThreadPoolExecutor = None) -> list:
+        """
+        Creates the constraints in the form the given scipy solver expects.
+
+        Parameters:
+            method (str): 'SLSQP' or 'trust-constr'.
+            executor (ThreadPoolExecutor): If given, the node force constraint jacobian is estimated on this thread pool.
+                                           Otherwise scipy estimates it (default is None).
+
+        Returns:
+            list: The bar length (equality) and node force (inequality) constraints.
+        """
+        # The node force constraint has no analytic jacobian, it is estimated by finite differences
+        if method == 'SLSQP':
+            force_constraint = {'type': 'ineq', 'fun': self._forceConstraint}
+            if executor:
+                force_constraint['jac'] = lambda x: self._finiteDifferenceJac(self._forceConstraint, x, executor)
+
+            return [{'type': 'eq', 'fun': self._barConstraints, 'jac': self._barConstraintsJac}, force_constraint]
+
+        force_jac = (lambda x: self._finiteDifferenceJac(self._nodeForceBalance, x, executor)) if executor else '2-point'
+        return [NonlinearConstraint(self._barConstraints, 0, 0, jac=self._barConstraintsSparseJac, hess=BFGS()), NonlinearConstraint(self._nodeForceBalance, -1e-1, 1e-1, jac=force_jac, hess=BFGS())]
+
+    def _finiteDifferenceJac(self, fun, x: np.ndarray, executor: ThreadPoolExecutor) -> np.ndarray:
+        """
+        Estimates the jacobian of fun with forward differences, evaluating the columns in parallel.
+
+        Parameters:
+            fun (callable): The function to differentiate, takes the input vector x and returns an array.
+            x (np.ndarray): The input vector to evaluate the jacobian at.
+            executor (ThreadPoolExecutor): The thread pool the columns are evaluated on.
+
+        Returns:
+            np.ndarray: The (len(fun(x)), len(x)) jacobian.
+        """
+        f0 = fun(x)
+        h = np.sqrt(np.finfo(float).eps) * np.maximum(1, np.abs(x)) # same step as scipy's default 2-point estimate
+
+        def column(i):
+            x_step = x.copy()
+            x_step[i] += h[i]
+            return (fun(x_step) - f0) / h[i]
+
+        return np.column_stack(list(executor.map(column, range(len(x)))))
+
     def _objective(self, x: np.ndarray) -> float:
         N, B_forces = self._getFromInputX(x)
 
-        energy_equations = np.zeros(len(self.string_connections))
+        return self._springConnectionEnergy(N).sum()
 
-        for i, connection in enumerate(self.string_connections):
-            energy_equations[i] = self._springConnectionEnergy(connection, N)
-        
-        return energy_equations.sum() 
-    
-    def _springConnectionEnergy(self, connection: Connection, N: np.ndarray) -> float:
+    def _objectiveJac(self, x: np.ndarray) -> np.ndarray:
         """
-        Calculates the energy stored in a spring connection.
+        Calculates the gradient of the objective function with respect to the input vector x.
 
-        Args:
-            connection (Connection): The spring connection object.
-            N (np.ndarray): The current positions of all nodes.
+        Parameters:
+            x (np.ndarray): The input vector containing node positions and bar forces.
 
         Returns:
-            float: The energy stored in the spring connection.
+            np.ndarray: The gradient, laid out the same as x. The bar forces don't affect the energy so their entries are 0.
         """
-        # current length
-        l = 0
-        for i in range(len(connection.nodes) - 1):
-            l += np.linalg.norm(N[self.node_indices[connection.nodes[i].name]] - N[self.node_indices[connection.nodes[i+1].name]])
+        N, B_forces = self._getFromInputX(x)
 
-        # energy
-        energy = 0.5 * connection.stiffness * (l - connection.length)**2
+        # The gradient is the negative of the (unclamped) spring forces
+        forces = np.zeros((len(self.nodes), self.d))
+        _spring_forces_kernel(N, self._string_seg_i, self._string_seg_j, self._string_seg_conn, self._string_k, self._string_L0, False, forces)
 
-        return energy
+        grad = -forces.ravel()[self._free_slots]
+        return np.append(grad, np.zeros(len(self.bar_connections)))
 
-    def _springConnectionForces(self, connection: Connection, N: np.ndarray) -> Dict[str, np.ndarray]:
+    def _springConnectionEnergy(self, N: np.ndarray) -> np.ndarray:
         """
-        Calculates the forces exerted by a spring connection on the nodes.
+        Calculates the energy stored in each spring connection.
 
         Args:
-            connection (Connection): The spring connection object.
             N (np.ndarray): The current positions of all nodes.
 
         Returns:
-            Dict[str, np.ndarray]: A dictionary containing node names as keys and the forces exerted on them by the spring connection as values.
+            np.ndarray: The energy stored in each spring connection.
         """
+        return _spring_energy_kernel(N, self._string_seg_i, self._string_seg_j, self._string_seg_conn, self._string_k, self._string_L0)
 
-        # current length
-        l = 0
-        for i in range(len(connection.nodes) - 1):
-            l += np.linalg.norm(N[self.node_indices[connection.nodes[i].name]] - N[self.node_indices[connection.nodes[i+1].name]])
-
-        # scalar force
-        F = connection.stiffness * (l - connection.length)
-        F = max(0, F) # force can only be positive
+    def _springConnectionForces(self, N: np.ndarray, forces: np.ndarray) -> None:
+        """
+        Calculates the forces exerted by the spring connections on the nodes.
 
-        forces = {node.name: np.zeros(self.d) for node in connection.nodes}
-        for i in range(len(connection.nodes) - 1):
-            N1 = N[self.node_indices[connection.nodes[i].name]]
-            N2 = N[self.node_indices[connection.nodes[i+1].name]]
+        Args:
+            N (np.ndarray): The current positions of all nodes.
+            forces (np.ndarray): The (n_nodes, d) array the forces exerted on each node by the spring connections are added to.
+        """
+        # Vector forces, pulling the ends of each segment towards each other. Force can only be positive
+        F = _spring_forces_kernel(N, self._string_seg_i, self._string_seg_j, self._string_seg_conn, self._string_k, self._string_L0, True, forces)
 
-            # Vector forces
-            forces[connection.nodes[i].name] += F * (N2 - N1) / np.linalg.norm(N2 - N1)
-            forces[connection.nodes[i+1].name] += F * (N1 - N2) / np.linalg.norm(N2 - N1)
-        
         # TODO: make optional if motor is located at node.
         # Add in force from control string pull
-        if connection.name and connection.name in self.controls:
-            control = self.controls[connection.name]
-            forces[control.node.name] += F * control.direction[:self.d] / np.linalg.norm(control.direction[:self.d])
-
-        return forces
+        np.add.at(forces, self._control_nodes, F[self._control_strings, None] * self._control_dirs)
     
     def _barConstraints(self, x):
         """
@@ -157,32 +448,70 @@ class Optimizer:
         - x: The input vector containing the values of Node positions and B_forces.
 
         Returns:
-        - constraints: A list of constraint values calculated based on the given input vector x.
+        - constraints: An array of constraint values calculated based on the given input vector x.
         """
         N, B_forces = self._getFromInputX(x)
         
-        constraints = []
         # Add the bar constraints (length must stay the same)
-        for connection in self.bar_connections:
-            N1 = N[self.node_indices[connection.nodes[0].name]]
-            N2 = N[self.node_indices[connection.nodes[1].name]]
-                
-            constraints.append(np.linalg.norm(N2 - N1) - connection.length)
-        
-        return constraints
+        return _bar_constraint_kernel(N, self._bar_i, self._bar_j, self._bar_L0)
+
+    def _barConstraintsJac(self, x: np.ndarray) -> np.ndarray:
+        """
+        Calculates the jacobian of the bar constraints with respect to the input vector x.
+
+        Parameters:
+            x (np.ndarray): The input vector containing node positions and bar forces.
+
+        Returns:
+            np.ndarray: The (len(bar_connections), len(x)) jacobian. Each row has the unit vector along the bar at the columns of its nodes.
+        """
+        N, B_forces = self._getFromInputX(x)
+
+        diff = N[self._bar_j] - N[self._bar_i]
+        unit = diff / np.sqrt(np.einsum('ij,ij->i', diff, diff))[:, None]
+
+        jac = np.zeros((len(self.bar_connections), len(self.nodes), self.d))
+        rows = np.arange(len(self.bar_connections))
+        jac[rows, self._bar_i] -= unit
+        jac[rows, self._bar_j] += unit
+
+        jac = jac.reshape(len(self.bar_connections), -1)[:, self._free_slots]
+        return np.hstack((jac, np.zeros((len(self.bar_connections), len(self.bar_connections)))))
+
+    def _barConstraintsSparseJac(self, x: np.ndarray) -> csr_matrix:
+        """
+        Calculates the jacobian of the bar constraints as a sparse matrix, see _barConstraintsJac.
+
+        Parameters:
+            x (np.ndarray): The input vector containing node positions and bar forces.
+
+        Returns:
+            csr_matrix: The (len(bar_connections), len(x)) jacobian, with at most 2*d entries per row.
+        """
+        N, B_forces = self._getFromInputX(x)
+
+        diff = N[self._bar_j] - N[self._bar_i]
+        unit = diff / np.sqrt(np.einsum('ij,ij->i', diff, diff))[:, None]
+
+        data = np.stack((-unit, unit)).ravel()[self._bar_jac_keep]
+        return csr_matrix((data, (self._bar_jac_rows, self._bar_jac_cols)), shape=(len(self.bar_connections), len(x)))
     
-    def _createInputX(self) -> np.ndarray:
+    def _createInputX(self, warm_start: bool = False) -> np.ndarray:
         """
         Creates the input vector x0 for the optimization problem.
 
+        Parameters:
+            warm_start (bool): If True and there is a previous solution, its bar forces are used instead of the default guess.
+
         Returns:
             np.ndarray: The input vector x0. 
                         The first d*len(nodes) elements are the node positions (except those that are pinned) 
                         and the last len(bar_connections) elements are the bar forces.
         """
-        x0 = np.array([node.position[:self.d] for node in self.nodes]).flatten() # position of the nodes
-        
-        x0 = np.delete(x0, [self.node_indices[node]*self.d + i for node, bools in self.pinned_nodes.items() for i in range(self.d) if bools[i]])
+        x0 = self.tensegrity.Positions[:, :self.d].flatten()[self._free_slots] # position of the (unpinned) nodes
+
+        if warm_start and self._last_x is not None and len(self._last_x) == len(x0) + len(self.bar_connections):
+            return np.append(x0, self._last_x[len(x0):]) # warm start from the last solved bar forces
 
         # BUG: Return the initial forces to 0 after testing.
         x0 = np.append(x0, [-5*np.sqrt(2)]*len(self.bar_connections)) # Add the bar forces to the initial guess (all zeros)
@@ -198,55 +527,53 @@ class Optimizer:
         Returns:
             tuple[np.ndarray, np.ndarray]: A tuple containing the extracted node positions and bar forces including those removed from the input because they were pinned.
         """
-        N = x[:-len(self.bar_connections)] # Get the node positions from the input vector
-            
-        # Add back in pinned nodes
-        ins_index = {}
-        for node, bools in self.pinned_nodes.items():
-            index = self.node_indices[node]*self.d
-            for i in range(self.d):
-                if bools[i]:
-                    ins_index[index + i] = self.nodes[self.node_indices[node]].position[i]
-        for index, value in ins_index.items(): # QUESTION: Will this always work as expected? Insert in the correct order?
-            N = np.insert(N, index, value)
-        
+        # Get the node positions from the input vector, the pinned nodes are already in the template
+        N = self._N_template.copy()
+        N[self._free_slots] = x[:self._n_free]
         N = N.reshape(-1, self.d)
 
-        B_forces = x[-len(self.bar_connections):] # Get the bar forces from the input vector (last len(bar_connections) elements)
+        B_forces = x[self._n_free:] # Get the bar forces from the input vector (last len(bar_connections) elements)
 
         return N, B_forces
     
-    def _nodeForces(self, x: np.ndarray) -> float:
+    def _nodeForceBalance(self, x: np.ndarray) -> np.ndarray:
         """
-        Calculates the sum of the squares of the forces acting on each node in the x and y directions.
+        Calculates the net force acting on each node in each (unpinned) direction.
 
         Parameters:
         - x (np.ndarray): The input vector containing the values of N and B_forces.
 
         Returns:
-        - float: The force value. Should be minimized to 0.
+        - np.ndarray: The signed net forces, laid out the same as the node positions in x. Should be 0 at equilibrium.
 
         """
         N, B_forces = self._getFromInputX(x)
 
         node_forces = np.zeros((len(self.nodes), self.d)) # d equations for each node that must sum to zero
+
+        self._springConnectionForces(N, node_forces)
+        _bar_forces_kernel(N, self._bar_i, self._bar_j, B_forces, node_forces)
         
-        for connection in self.string_connections:
-            forces = self._springConnectionForces(connection, N)
-            for node, force in forces.items():
-                node_forces[self.node_indices[node]] += force
-
-        for connection in self.bar_connections:
-            N1 = N[self.node_indices[connection.nodes[0].name]]
-            N2 = N[self.node_indices[connection.nodes[1].name]]
-            
-            F = B_forces[self.bar_indices[connection]] * (N2 - N1) / np.linalg.norm(N2 - N1)
-            node_forces[self.node_indices[connection.nodes[0].name]] += F
-            node_forces[self.node_indices[connection.nodes[1].name]] += -F
-        
-        node_forces = np.delete(node_forces.flatten(), [self.node_indices[node]*self.d + i for node, bools in self.pinned_nodes.items() for i in range(self.d) if bools[i]])
-        
-        return np.abs(node_forces)
+        return node_forces.ravel()[self._free_slots]
+
+    def _forceConstraint(self, x: np.ndarray) -> np.ndarray:
+        """
+        Inequality constraint keeping the net force on every node below 0.1 (non-negative when satisfied).
+        """
+        return 1e-1 - self._nodeForces(x)
+
+    def _nodeForces(self, x: np.ndarray) -> float:
+        """
+        Calculates the sum of the squares of the forces acting on each node in the x and y directions.
+
+        Parameters:
+        - x (np.ndarray): The input vector containing the values of N and B_forces.
+
+        Returns:
+        - float: The force value. Should be minimized to 0.
+
+        """
+        return np.abs(self._nodeForceBalance(x))
     
     def _updateForces(self, N: np.ndarray, B_forces: np.ndarray) -> None:
         """
@@ -268,16 +595,11 @@ class Optimizer:
         Note: The force for string connections is clamped to be non-negative.
 
         """
-        for connection in self.string_connections:
-            # current length
-            l = 0
-            for i in range(len(connection.nodes) - 1):
-                l += np.linalg.norm(N[self.node_indices[connection.nodes[i].name]] - N[self.node_indices[connection.nodes[i+1].name]])
-
-            # scalar force
-            F = connection.stiffness * (l - connection.length)
-            F = max(0, F) # force can only be positive
-            connection.force = F
-
-        for connection in self.bar_connections:
-            connection.force = B_forces[self.bar_indices[connection]]
\ No newline at end of file
+        # scalar force, can only be positive
+        _, _, l = _string_lengths_kernel(N, self._string_seg_i, self._string_seg_j, self._string_seg_conn, len(self.string_connections))
+        F = np.maximum(0, self._string_k * (l - self._string_L0))
+        for connection, force in zip(self.string_connections, F):
+            connection.force = force
+
+        for connection, force in zip(self.bar_connections, B_forces):
+            connection.force = force
\ No newline at end of file
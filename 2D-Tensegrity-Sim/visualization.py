@@ -1,6 +1,9 @@
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import numpy as np
 
+from data_structures import build_index_arrays
+
 class Visualization:
     def __init__(self, Tensegrity, dim=2):
         """
@@ -12,12 +15,20 @@ class Visualization:
         - dim (int): The dimension of the visualization (default is 2).
         """
         self.Nodes = Tensegrity.Nodes
+        self.Positions = Tensegrity.Positions
         self.Connections = Tensegrity.Connections
         self.Pins = Tensegrity.Pins
         self.Controls = Tensegrity.Controls
 
         self.dim = dim
 
+        # Artists kept between plots so redraws only update their data
+        self._string_lc = None
+        self._bar_lc = None
+        self._pinned_scatter = None
+        self._free_scatter = None
+        self._label_artists = []
+
         self.fig, self.ax = plt.subplots()
     
     def plot(self, label_nodes: bool = False, label_connections: bool = False, label_forces: bool = False):
@@ -40,68 +51,117 @@ class Visualization:
         else:
             raise NotImplementedError("3D visualization not implemented yet.")
         
-    def _plot_2d(self, label_nodes: bool = False, label_connections: bool = False, label_forces: bool = False):
+    def _setup_2d(self):
             """
-            Plots the 2D visualization of the tensegrity structure.
-
-            Parameters:
-            - label_nodes (bool): If True, labels the nodes on the plot.
+            Clears the axes and creates the artists for the connections and nodes.
+            Only needed on the first plot or when the connections change, later plots update these artists.
 
             Returns:
             - None
             """
             self.ax.clear()
             self.ax.set_aspect('equal')
+            self._label_artists = []
+
+            # Node indices of each connection, so node positions can be gathered into arrays with one lookup.
+            # Cached on the connections by YamlParser (or the Optimizer), only built here for a tensegrity made by hand.
+            if any(getattr(connection, '_idx', None) is None for connection in self.Connections):
+                build_index_arrays(self.Nodes, self.Connections)
+            self._connection_idx = [connection._idx for connection in self.Connections]
+
+            # Set string colors
             color_index = 1 # Using "CN" color cycle
-            color_names = {}
-            
-            # --- Plot connections ---
+            self._color_names = {}
+            string_colors = []
             for connection in self.Connections:
-                # Strings are dashed lines
                 if connection.stiffness > 0:
-                    # Set color
                     color = 'k'
                     if connection.name or len(connection.nodes) > 2:
                         color = f"C{color_index}"
                         if connection.name:
-                            color_names[connection.name] = color_index
+                            self._color_names[connection.name] = color_index
                         color_index += 1
-                    
-                    style = '--' if connection.force > 1e-3 else ':'
-                    # Plot line
-                    self.ax.plot([node.position[0] for node in connection.nodes], [node.position[1] for node in connection.nodes], f'{color}{style}')
-                    
-                
-                # Bars are solid lines
+                    string_colors.append(color)
+
+            # Strings are dashed lines, bars are solid lines
+            self._string_lc = self.ax.add_collection(LineCollection([], colors=string_colors))
+            self._bar_lc = self.ax.add_collection(LineCollection([], colors='k'))
+
+            # TODO: How to differentiate between 1D and 2D pinning?
+            self._pinned = np.array([node.name in self.Pins for node in self.Nodes], dtype=bool)
+            self._pinned_scatter = self.ax.scatter([], [], c='r', marker='X', zorder=3)
+            self._free_scatter = self.ax.scatter([], [], c='k', marker='o', zorder=3)
+
+            self.fig.show()
+
+    def _plot_2d(self, label_nodes: bool = False, label_connections: bool = False, label_forces: bool = False):
+            """
+            Plots the 2D visualization of the tensegrity structure.
+
+            Parameters:
+            - label_nodes (bool): If True, labels the nodes on the plot.
+
+            Returns:
+            - None
+            """
+            if self._string_lc is None or len(self._connection_idx) != len(self.Connections):
+                self._setup_2d()
+
+            P = self.Positions[:, :2].astype(np.float32) # only used for drawing, so single precision is enough
+            
+            # --- Plot connections ---
+            string_lines, string_styles = [], []
+            bar_lines, bar_styles = [], []
+            for connection, idx in zip(self.Connections, self._connection_idx):
+                if connection.stiffness > 0:
+                    string_lines.append(P[idx])
+                    string_styles.append('--' if connection.force > 1e-3 else ':')
                 elif connection.stiffness == 0:
-                    style = '-' if np.abs(connection.force) > 1e-3 else '-.'
-                    self.ax.plot([connection.nodes[0].position[0], connection.nodes[1].position[0]], [connection.nodes[0].position[1], connection.nodes[1].position[1]], f'k{style}')
+                    bar_lines.append(P[idx[:2]])
+                    bar_styles.append('-' if np.abs(connection.force) > 1e-3 else '-.')
+
+            self._string_lc.set_segments(string_lines)
+            self._string_lc.set_linestyles(string_styles)
+            self._bar_lc.set_segments(bar_lines)
+            self._bar_lc.set_linestyles(bar_styles)
 
             # --- plot nodes and label ---
-            for node in self.Nodes:
-                # TODO: How to differentiate between 1D and 2D pinning?
-                if node.name in self.Pins:
-                    self.ax.plot(node.position[0], node.position[1], 'rX')
-                else:
-                    self.ax.plot(node.position[0], node.position[1], 'ko')
-                if label_nodes:
-                    self.ax.annotate(node.name, (node.position[0], node.position[1]), (.2, .2), textcoords='offset fontsize')
+            self._pinned_scatter.set_offsets(P[self._pinned])
+            self._free_scatter.set_offsets(P[~self._pinned])
+
+            # Labels and control arrows change with the label options and forces, so they are recreated
+            for artist in self._label_artists:
+                artist.remove()
+            self._label_artists = []
+
+            if label_nodes:
+                for node, p in zip(self.Nodes, P):
+                    self._label_artists.append(self.ax.annotate(node.name, p, (.2, .2), textcoords='offset fontsize'))
             
+            # Label connections at the middle of their first two nodes
+            midpoints = (P[[idx[0] for idx in self._connection_idx]] + P[[idx[1] for idx in self._connection_idx]]) / 2
             if label_forces:
-                for connection in self.Connections:
+                for connection, midpoint in zip(self.Connections, midpoints):
                     if connection.name:
-                        self.ax.annotate(f"{connection.name}: {connection.force:.2f}", ((connection.nodes[0].position[0] + connection.nodes[1].position[0])/2, (connection.nodes[0].position[1] + connection.nodes[1].position[1])/2), ha='center')
+                        self._label_artists.append(self.ax.annotate(f"{connection.name}: {connection.force:.2f}", midpoint, ha='center'))
                     else:
-                        self.ax.annotate(f"{connection.force:.2f}", ((connection.nodes[0].position[0] + connection.nodes[1].position[0])/2, (connection.nodes[0].position[1] + connection.nodes[1].position[1])/2), ha='center')
+                        self._label_artists.append(self.ax.annotate(f"{connection.force:.2f}", midpoint, ha='center'))
             elif label_connections:
-                for connection in self.Connections:
+                for connection, midpoint in zip(self.Connections, midpoints):
                     if connection.name:
-                        self.ax.annotate(connection.name, ((connection.nodes[0].position[0] + connection.nodes[1].position[0])/2, (connection.nodes[0].position[1] + connection.nodes[1].position[1])/2), ha='center')
+                        self._label_artists.append(self.ax.annotate(connection.name, midpoint, ha='center'))
+
+            # Fit the axes to the current node positions
+            self.ax.ignore_existing_data_limits = True
+            self.ax.update_datalim(P)
 
             # --- plot controls ---
             if self.Controls:
                 for control in self.Controls:
-                    color = f"C{color_names[control.connection.name]}" # Make sure the color matches the associated connection
-                    self.ax.arrow(control.node.position[0], control.node.position[1], control.direction[0], control.direction[1], head_width=0.05, head_length=0.1, width=.01, color=color)
+                    color = f"C{self._color_names[control.connection.name]}" # Make sure the color matches the associated connection
+                    self._label_artists.append(self.ax.arrow(control.node.position[0], control.node.position[1], control.direction[0], control.direction[1], head_width=0.05, head_length=0.1, width=.01, color=color))
 
-            self.fig.show()
+            self.ax.autoscale_view()
+
+            self.fig.canvas.draw_idle()
+            self.fig.canvas.flush_events()
\ No newline at end of file
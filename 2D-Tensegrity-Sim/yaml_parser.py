@@ -3,7 +3,7 @@ import yaml
 
 from numpy import inf
 
-from data_structures import Node, Connection, Control, Tensegrity
+from data_structures import Node, Connection, Control, Tensegrity, IndexArrays
 
 class YamlParser:
     """
@@ -53,6 +53,9 @@ class YamlParser:
             # --- Connections ---
             Connections = [] # List to store connections used to create Tensegrity object
             connection_names = {} # Dictionary to store named connections
+
+            # Index arrays used by the Optimizer, filled as the connections are created so it doesn't have to loop over them again
+            index_arrays = IndexArrays({name: i for i, name in enumerate(Nodes)})
             
             for connection_type in data["connections"]:
                 
@@ -74,8 +77,10 @@ class YamlParser:
                             connection = Connection([Nodes[n_name] for n_name in NodesList], connection_type, stiffness, pretension, name)
                             Connections.append(connection)
                             connection_names[name] = connection
+                            index_arrays.add_connection(connection)
                     else:
                         Connections.append(Connection([Nodes[n_name] for n_name in connection], connection_type, stiffness, pretension))
+                        index_arrays.add_connection(Connections[-1])
             
 
             # --- Pins ---
@@ -91,5 +96,8 @@ class YamlParser:
                     node = Nodes[data["control"][name]["node"]] # Get node object
                     Controls.append(Control(connection_names[name], node, data["control"][name]["direction"]))
 
-        return Tensegrity(list(Nodes.values()), Connections, Pins, Controls)
+        tensegrity = Tensegrity(list(Nodes.values()), Connections, Pins, Controls)
+        tensegrity._prebuilt_arrays = index_arrays.to_dict() # used by the Optimizer
+
+        return tensegrity
         
\ No newline at end of file